@@ -1,11 +1,34 @@
 import os
+import difflib
 import json
+import asyncio
+import hashlib
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import numpy as np
 import pandas as pd
-from typing import Optional, Dict, Any, List
-from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, List, Literal, Tuple, Union
+from pydantic import BaseModel, Field, ValidationError
 from dotenv import load_dotenv
 import re
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Arrow's multi-threaded CSV reader is optional; fall back to pandas ---
+try:
+    import pyarrow.csv as pacsv
+except Exception:
+    pacsv = None
+
+# --- Polars is optional; only needed when USE_POLARS=1 ---
+try:
+    import polars as pl
+except Exception:
+    pl = None
 
 # --- Use langchain_openai if available ---
 try:
@@ -32,9 +55,19 @@ if not OPENAI_API_KEY:
 if not DATA_GOV_API_KEY:
     raise ValueError("DATA_GOV_API_KEY missing. Set it in .env file.")
 
+# Set USE_POLARS=1 to run the agriculture aggregations on Polars instead of pandas
+USE_POLARS = os.getenv("USE_POLARS") == "1"
+if USE_POLARS and pl is None:
+    raise RuntimeError("USE_POLARS=1 requires polars. Install it with `pip install polars`.")
+
+# Set RAINFALL_BULK_CACHE=0 to skip the one-shot rainfall table and query the API per year
+RAINFALL_BULK_CACHE = os.getenv("RAINFALL_BULK_CACHE", "1") != "0"
+
 # --- Data Sources ---
 RAINFALL_API_URL = "https://api.data.gov.in/resource/8e0bd482-4aba-4d99-9cb9-ff124f6f1c2f"
 LOCAL_CSV_PATH = os.path.join(os.path.dirname(__file__), "data", "agriculture_production.csv")
+AGRI_PARQUET_PATH = os.path.splitext(LOCAL_CSV_PATH)[0] + ".parquet"
+RAINFALL_CACHE_PATH = os.path.join(os.path.dirname(__file__), "data", "rainfall_cache.parquet")
 RAINFALL_SOURCE_NAME = f"data.gov.in (Rainfall 1901-2017): {RAINFALL_API_URL}"
 AGRICULTURE_SOURCE_NAME = f"data.gov.in (Crop Production): {LOCAL_CSV_PATH}"
 
@@ -42,29 +75,75 @@ AGRICULTURE_SOURCE_NAME = f"data.gov.in (Crop Production): {LOCAL_CSV_PATH}"
 # ---------------------------
 # Simple LLM wrapper
 # ---------------------------
-def llm_call(prompt: str, max_tokens: int = 1500, temperature: float = 0.0) -> str:
-    """Minimal wrapper to call the LLM."""
+LLM_MODEL = "gpt-4o-mini"
+
+# One client for the whole process so its HTTP connection pool is reused across calls.
+# Per-call settings (temperature, max_tokens, response_format) are passed at call time.
+if LLM_PROVIDER == "langchain_openai":
+    _llm = ChatOpenAI(api_key=OPENAI_API_KEY, model=LLM_MODEL)
+else:
+    _llm = openai.OpenAI(api_key=OPENAI_API_KEY)
+
+# LRU memo of deterministic LLM responses, keyed only on the prompt's BLAKE2 digest
+LLM_CACHE_SIZE = 1024
+_llm_cache: "OrderedDict[str, str]" = OrderedDict()
+_llm_cache_lock = threading.Lock()
+
+def llm_call(
+    system: str,
+    messages: List[Dict[str, str]],
+    max_tokens: int = 1500,
+    temperature: float = 0.0,
+    json_mode: bool = False
+) -> str:
+    """
+    Minimal wrapper to call the LLM with a static system message followed by role-based messages.
+    Keeping the system message identical across calls lets OpenAI's prompt caching reuse it.
+    With 'json_mode', the API is asked for a single JSON object (response_format=json_object).
+    Deterministic calls (temperature 0.0) are memoized on a BLAKE2 digest of the prompt,
+    so the cache holds 32-character keys rather than every full prompt.
+    """
+    turns = tuple((m["role"], m["content"]) for m in messages)
+    if temperature != 0.0:
+        return _llm_call_uncached(system, turns, max_tokens, temperature, json_mode)
+
+    prompt_hash = hashlib.blake2b(
+        json.dumps([LLM_MODEL, json_mode, max_tokens, system, turns]).encode(), digest_size=16
+    ).hexdigest()
+    with _llm_cache_lock:
+        if prompt_hash in _llm_cache:
+            _llm_cache.move_to_end(prompt_hash)
+            return _llm_cache[prompt_hash]
+
+    response = _llm_call_uncached(system, turns, max_tokens, temperature, json_mode)
+    with _llm_cache_lock:
+        _llm_cache[prompt_hash] = response
+        if len(_llm_cache) > LLM_CACHE_SIZE:
+            _llm_cache.popitem(last=False)
+    return response
+
+def _llm_call_uncached(
+    system: str,
+    turns: Tuple[Tuple[str, str], ...],
+    max_tokens: int,
+    temperature: float,
+    json_mode: bool
+) -> str:
+    messages = [{"role": "system", "content": system}] + [{"role": r, "content": c} for r, c in turns]
+    extra = {"response_format": {"type": "json_object"}} if json_mode else {}
     if LLM_PROVIDER == "langchain_openai":
-        llm = ChatOpenAI(
-            api_key=OPENAI_API_KEY,
-            model="gpt-4o-mini",
-            temperature=temperature,
-            max_tokens=max_tokens
-        )
         try:
-            resp = llm.invoke(prompt)
+            resp = _llm.invoke(messages, temperature=temperature, max_tokens=max_tokens, **extra)
             return str(resp.content)
         except Exception as e:
             raise RuntimeError(f"LLM call failed (langchain_openai.invoke): {e}")
     else:
-        # Legacy openai v0.x call
-        import openai  # type: ignore
-        openai.api_key = OPENAI_API_KEY
-        resp = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
+        resp = _llm.chat.completions.create(
+            model=LLM_MODEL,
+            messages=messages,
             max_tokens=max_tokens,
             temperature=temperature,
+            **extra
         )
         return resp.choices[0].message.content
 
@@ -72,17 +151,89 @@ def llm_call(prompt: str, max_tokens: int = 1500, temperature: float = 0.0) -> s
 # Data Loading Utility
 # ---------------------------
 _df_agri = None
+# Lazy loaders are reached from parallel tool threads and concurrent requests;
+# each lock makes its loader build its frame once, with later callers waiting on it
+_AGRI_LOCK = threading.Lock()
+
+# Columns the tools read; everything else in the CSV is dropped at load time
+AGRI_COLUMNS = ["district", "year", "crop", "production_tonnes", "state_lc", "crop_lc"]
+
+def _read_agri_csv(path: str) -> pd.DataFrame:
+    """Reads the raw CSV with pyarrow when available (skipping malformed rows), else pandas."""
+    if pacsv is None:
+        return pd.read_csv(path)
+    skipped = 0
+
+    def skip_row(row) -> str:
+        nonlocal skipped
+        skipped += 1
+        return "skip"
+
+    parse_options = pacsv.ParseOptions(invalid_row_handler=skip_row)
+    df = pacsv.read_csv(path, parse_options=parse_options).to_pandas()
+    if skipped:
+        # pandas would raise on these rows, so make the difference visible
+        print(f"Skipped {skipped} malformed rows while reading the agriculture CSV.")
+    return df
+
+def _slim_agri(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Keeps only AGRI_COLUMNS and stores them compactly (int16 year, categories).
+    Production stays float64: per-district values reach 1e9, beyond float32's precision.
+    """
+    df = df[[c for c in AGRI_COLUMNS if c in df.columns]]
+    dtypes = {"production_tonnes": "float64"}
+    if "year" in df.columns:
+        dtypes["year"] = "int16"
+    # Dictionary-encode the low-cardinality name columns (~30 states, ~100 crops)
+    # so substring scans run over the categories rather than every row
+    for c in ("crop", "district", "state_lc", "crop_lc"):
+        if c in df.columns:
+            dtypes[c] = "category"
+    return df.astype(dtypes)
+
+def _write_parquet_atomic(df: pd.DataFrame, path: str, **kwargs) -> None:
+    """Writes to a temp file next to `path` and renames it, so readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path, **kwargs)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
 def get_agri_data() -> pd.DataFrame:
-    """Loads the agriculture CSV into memory (with caching) and cleans it."""
+    """Returns the cleaned agriculture frame, loading it on first use."""
     global _df_agri
-    if _df_agri is not None:
-        return _df_agri
+    if _df_agri is None:
+        with _AGRI_LOCK:
+            if _df_agri is None:
+                _df_agri = _load_agri_data()
+    return _df_agri
+
+def _load_agri_data() -> pd.DataFrame:
+    """
+    Loads the agriculture data into memory and cleans it.
+    The cleaned frame is written to Parquet so later cold starts skip the CSV parse;
+    the Parquet file is only used while it is newer than the CSV.
+    """
+    if os.path.exists(AGRI_PARQUET_PATH) and (
+        not os.path.exists(LOCAL_CSV_PATH)
+        or os.path.getmtime(AGRI_PARQUET_PATH) >= os.path.getmtime(LOCAL_CSV_PATH)
+    ):
+        try:
+            # Slimmed again in case the cache predates the current column set
+            return _slim_agri(pd.read_parquet(AGRI_PARQUET_PATH, engine="pyarrow", memory_map=True))
+        except Exception as e:
+            # Unreadable cache: fall through to the CSV, which rewrites it below
+            print(f"Could not read agriculture Parquet cache, re-parsing CSV: {e}")
     
     if not os.path.exists(LOCAL_CSV_PATH):
         raise FileNotFoundError(f"CSV not found at {LOCAL_CSV_PATH}")
     
-    df = pd.read_csv(LOCAL_CSV_PATH)
+    df = _read_agri_csv(LOCAL_CSV_PATH)
     df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
     
     # Find production column
@@ -94,15 +245,300 @@ def get_agri_data() -> pd.DataFrame:
     df["production_tonnes"] = pd.to_numeric(df[prod_col], errors="coerce").fillna(0)
     if "year" in df.columns:
         df["year"] = pd.to_numeric(df["year"].astype(str).str.split("-").str[0], errors="coerce").fillna(0).astype(int)
-    
-    # Cache it
-    _df_agri = df
+
+    # Lowercased lookup columns so tools can match with a plain substring scan
+    for col in ("state", "crop"):
+        if col in df.columns:
+            df[f"{col}_lc"] = df[col].astype(str).str.lower()
+
+    df = _slim_agri(df)
+
+    try:
+        _write_parquet_atomic(df, AGRI_PARQUET_PATH, compression="zstd")
+    except Exception as e:
+        print(f"Could not write agriculture Parquet cache: {e}")
     return df
 
+def _name_mask(col: pd.Series, query: str) -> np.ndarray:
+    """
+    Boolean row mask for a lowercase categorical name column.
+    The (substring) match is resolved once against the category dictionary;
+    the rows are then compared as integer codes.
+    """
+    q = query.lower()
+    matches = [i for i, name in enumerate(col.cat.categories) if q in name]
+    codes = col.cat.codes.to_numpy()
+    if len(matches) == 1:
+        return codes == matches[0]
+    return np.isin(codes, matches)
+
+_df_agri_agg = None
+_AGRI_AGG_LOCK = threading.Lock()
+
+def get_agri_agg_data() -> pd.DataFrame:
+    """
+    Returns production pre-summed per (state, year, crop), built once from the row-level frame.
+    Only the district tool needs the row-level data; everything else reads this much smaller table.
+    """
+    global _df_agri_agg
+    if _df_agri_agg is None:
+        with _AGRI_AGG_LOCK:
+            if _df_agri_agg is None:
+                _df_agri_agg = get_agri_data().groupby(
+                    ["state_lc", "year", "crop", "crop_lc"], as_index=False, observed=True
+                )["production_tonnes"].sum()
+    return _df_agri_agg
+
+_AGRI_BY_STATE: Optional[Dict[str, pd.DataFrame]] = None
+_AGRI_AGG_BY_STATE: Optional[Dict[str, pd.DataFrame]] = None
+_AGRI_BY_STATE_LOCK = threading.Lock()
+
+def _split_by_state(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    return {s: g.reset_index(drop=True) for s, g in df.groupby("state_lc", observed=True)}
+
+def get_agri_by_state(aggregated: bool = False) -> Dict[str, pd.DataFrame]:
+    """
+    Returns the agriculture frame (or the pre-aggregated table when 'aggregated')
+    pre-split into per-state sub-frames, keyed by lowercase state.
+    """
+    global _AGRI_BY_STATE, _AGRI_AGG_BY_STATE
+    if aggregated:
+        if _AGRI_AGG_BY_STATE is None:
+            with _AGRI_BY_STATE_LOCK:
+                if _AGRI_AGG_BY_STATE is None:
+                    _AGRI_AGG_BY_STATE = _split_by_state(get_agri_agg_data())
+        return _AGRI_AGG_BY_STATE
+    if _AGRI_BY_STATE is None:
+        with _AGRI_BY_STATE_LOCK:
+            if _AGRI_BY_STATE is None:
+                _AGRI_BY_STATE = _split_by_state(get_agri_data())
+    return _AGRI_BY_STATE
+
+def _match_names(names: List[str], query: str) -> List[str]:
+    """
+    Maps a query to lowercase names: an exact match first, then substring
+    matches, then the closest fuzzy match (to absorb typos like 'Maharastra').
+    The fuzzy step also compares against each name's first word, so a typo of
+    a short form ('Andamn' for 'andaman and nicobar islands') still resolves.
+    """
+    q = query.lower().strip()
+    if q in names:
+        return [q]
+    matches = [n for n in names if q in n]
+    if matches:
+        return matches
+    close = difflib.get_close_matches(q, names, n=1, cutoff=0.8)
+    if close:
+        return close
+    first_words = {n.split()[0]: n for n in names if n.strip()}
+    close = difflib.get_close_matches(q, list(first_words), n=1, cutoff=0.8)
+    return [first_words[close[0]]] if close else []
+
+def lookup_agri(
+    state: str,
+    years: Union[int, slice],
+    crop: Optional[str] = None,
+    aggregated: bool = False
+) -> pd.DataFrame:
+    """
+    Returns the rows for a state, a year (or inclusive slice of years) and optionally a crop,
+    from the row-level frame or, with 'aggregated', from the (state, year, crop) totals.
+    The state picks a pre-split sub-frame; year and crop are then NumPy comparisons
+    on that much smaller frame (crop via its category codes).
+    """
+    by_state = get_agri_by_state(aggregated)
+    keys = _match_names(list(by_state), state)
+    if not keys:
+        return (get_agri_agg_data() if aggregated else get_agri_data()).iloc[0:0]
+    df = by_state[keys[0]] if len(keys) == 1 else pd.concat([by_state[k] for k in keys], ignore_index=True)
+
+    year_values = df["year"].to_numpy()
+    if isinstance(years, slice):
+        mask = (year_values >= years.start) & (year_values <= years.stop)
+    else:
+        mask = year_values == years
+    if crop:
+        mask &= _name_mask(df["crop_lc"], crop)
+    return df[mask]
+
+# --- Polars backend (USE_POLARS=1) ---
+_df_agri_pl = None
+_df_agri_agg_pl = None
+_AGRI_PL_STATES: List[str] = []
+_AGRI_PL_LOCK = threading.Lock()
+
+def _to_polars(df: pd.DataFrame) -> "pl.DataFrame":
+    return pl.from_pandas(df).with_columns(pl.col(pl.Categorical).cast(pl.Utf8))
+
+def get_agri_data_pl(aggregated: bool = False) -> "pl.DataFrame":
+    """
+    Returns the cleaned agriculture frame (or the pre-aggregated table when 'aggregated')
+    as a Polars DataFrame, with name columns as plain strings.
+    """
+    global _df_agri_pl, _df_agri_agg_pl, _AGRI_PL_STATES
+    if _df_agri_pl is None or (aggregated and _df_agri_agg_pl is None):
+        with _AGRI_PL_LOCK:
+            if _df_agri_pl is None:
+                _df_agri_pl = _to_polars(get_agri_data())
+                _AGRI_PL_STATES = sorted(_df_agri_pl["state_lc"].drop_nulls().unique().to_list())
+            if aggregated and _df_agri_agg_pl is None:
+                _df_agri_agg_pl = _to_polars(get_agri_agg_data())
+    return _df_agri_agg_pl if aggregated else _df_agri_pl
+
+def lookup_agri_pl(
+    state: str,
+    start_year: int,
+    end_year: int,
+    crop: Optional[str] = None,
+    aggregated: bool = False
+) -> "pl.LazyFrame":
+    """Polars counterpart of lookup_agri: a lazy, filtered frame (predicates are pushed down)."""
+    df = get_agri_data_pl(aggregated)
+    predicate = pl.col("state_lc").is_in(_match_names(_AGRI_PL_STATES, state)) & \
+                pl.col("year").is_between(start_year, end_year)
+    if crop:
+        predicate = predicate & pl.col("crop_lc").str.contains(crop.lower(), literal=True)
+    return df.lazy().filter(predicate)
+
+def _sums_pl(frame: "pl.LazyFrame", key: str) -> pd.Series:
+    """Sums production per 'key' in Polars and returns the (small) result as a pandas Series."""
+    out = frame.drop_nulls(key).group_by(key).agg(pl.col("production_tonnes").sum()).collect()
+    return pd.Series(out["production_tonnes"].to_list(), index=out[key].to_list(), dtype="float64")
+
+# --- Aggregations shared by the tools (pandas or Polars backend) ---
+def crop_totals(state: str, year: int) -> pd.Series:
+    """Total production per crop for a state and year."""
+    if USE_POLARS:
+        return _sums_pl(lookup_agri_pl(state, year, year, aggregated=True), "crop")
+    return lookup_agri(state, year, aggregated=True).groupby("crop", observed=True)["production_tonnes"].sum()
+
+def district_totals(state: str, year: int, crop: str) -> pd.Series:
+    """Total production per district for a crop, state and year."""
+    if USE_POLARS:
+        return _sums_pl(lookup_agri_pl(state, year, year, crop), "district")
+    return lookup_agri(state, year, crop).groupby("district", observed=True)["production_tonnes"].sum()
+
+def year_totals(state: str, crop: str, start_year: int, end_year: int) -> pd.Series:
+    """Total production per year for a crop and state over an inclusive year range."""
+    if USE_POLARS:
+        return _sums_pl(lookup_agri_pl(state, start_year, end_year, crop, aggregated=True), "year")
+    return lookup_agri(state, slice(start_year, end_year), crop, aggregated=True).groupby("year")["production_tonnes"].sum()
+
 # ---------------------------
 # Tool Schemas and Functions
 # ---------------------------
 
+RAINFALL_MONTHS = ["jan","feb","mar","apr","may","jun","jul","aug","sep","oct","nov","dec"]
+RAINFALL_MAX_CONCURRENCY = 5 # Max in-flight data.gov.in requests for per-year fetches
+_rainfall_df = None
+_RAINFALL_LOCK = threading.Lock()
+_rainfall_fallback_df = None # Full table for per-year filter misses (RAINFALL_BULK_CACHE=0)
+_rainfall_year_cache: Dict[Tuple[str, int], Dict[str, Any]] = {} # Per-(state, year) API results
+
+# Shared session so data.gov.in calls reuse pooled TCP/TLS connections
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=Retry(total=2, backoff_factor=0.2)))
+
+def _rainfall_frame(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Builds the rainfall frame with numeric month columns and precomputed totals."""
+    df = pd.DataFrame(records)
+    for m in RAINFALL_MONTHS:
+        if m not in df.columns:
+            df[m] = 0
+    numeric_cols = RAINFALL_MONTHS + ["year"]
+    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors="coerce")
+    df[RAINFALL_MONTHS] = df[RAINFALL_MONTHS].fillna(0)
+    df["subdivision"] = df["subdivision"].fillna("").astype(str)
+    df["subdivision_lc"] = df["subdivision"].str.lower()
+    df["total_rainfall_mm"] = df[RAINFALL_MONTHS].sum(axis=1)
+    df["avg_monthly"] = df[RAINFALL_MONTHS].mean(axis=1)
+    return df[["subdivision", "subdivision_lc", "year"] + RAINFALL_MONTHS + ["total_rainfall_mm", "avg_monthly"]]
+
+def _rainfall_params(state: Optional[str] = None, year: Optional[int] = None) -> Dict[str, Any]:
+    """API query parameters; 'state'/'year' are pushed to data.gov.in as server-side filters."""
+    params = {"api-key": DATA_GOV_API_KEY, "format": "json", "limit": 5000}
+    if state:
+        params["filters[subdivision]"] = state
+    if year:
+        params["filters[year]"] = str(year)
+    return params
+
+def _fetch_rainfall_payload(params: Dict[str, Any]) -> Dict[str, Any]:
+    r = _SESSION.get(RAINFALL_API_URL, params=params, timeout=20)
+    r.raise_for_status()
+    return r.json()
+
+def _fetch_rainfall_records(params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return _fetch_rainfall_payload(params).get("records", [])
+
+def _fetch_rainfall_df() -> Tuple[pd.DataFrame, bool]:
+    """
+    Fetches the full (unfiltered) rainfall table from the API in one synchronous request.
+    Also returns whether it is complete: the record count matches the response's 'total'
+    (sample API keys and the 'limit' cap both return fewer rows).
+    """
+    payload = _fetch_rainfall_payload(_rainfall_params())
+    records = payload.get("records", [])
+    if not records:
+        raise ValueError("No rainfall records returned by API.")
+    total = payload.get("total")
+    complete = total is not None and len(records) == int(total)
+    if not complete:
+        print(f"Rainfall API returned {len(records)} records but reports total={total!r}; the table is incomplete.")
+    return _rainfall_frame(records), complete
+
+def _get_rainfall_df() -> pd.DataFrame:
+    """Returns the full rainfall table, loading it on first use."""
+    global _rainfall_df
+    if _rainfall_df is None:
+        with _RAINFALL_LOCK:
+            if _rainfall_df is None:
+                _rainfall_df = _load_rainfall_df()
+    return _rainfall_df
+
+def _load_rainfall_df() -> pd.DataFrame:
+    """
+    Loads the rainfall records (from the Parquet cache, or the API on first run)
+    with numeric month columns and precomputed totals.
+    """
+    if os.path.exists(RAINFALL_CACHE_PATH):
+        try:
+            return pd.read_parquet(RAINFALL_CACHE_PATH)
+        except Exception as e:
+            # Unreadable cache: refetch from the API, which rewrites it below
+            print(f"Could not read rainfall cache, refetching: {e}")
+
+    df, complete = _fetch_rainfall_df()
+
+    # Persist so restarts skip the network entirely; an incomplete table is
+    # only kept in memory so the next run fetches it again
+    if complete:
+        try:
+            _write_parquet_atomic(df, RAINFALL_CACHE_PATH)
+        except Exception as e:
+            print(f"Could not write rainfall cache: {e}")
+    return df
+
+def _summarize_rainfall(df: pd.DataFrame, state: str, year: int) -> Dict[str, Any]:
+    """Filters a rainfall frame down to one state and year and returns the tool result."""
+    state_mask = df["subdivision_lc"].str.contains(state.lower(), regex=False, na=False)
+    df_filtered = df[state_mask & (df["year"] == year)]
+    
+    if df_filtered.empty:
+        available = sorted(df[state_mask]["year"].dropna().unique().tolist())
+        return {"error": f"No data for {state} in {year}. Available years for this state: {available}", "source": RAINFALL_SOURCE_NAME}
+    
+    total = float(df_filtered["total_rainfall_mm"].iloc[0])
+    avg = float(df_filtered["avg_monthly"].iloc[0])
+    
+    return {
+        "state": state,
+        "year": int(year),
+        "total_rainfall_mm": round(total, 2),
+        "average_monthly_rainfall_mm": round(avg, 2),
+        "source": RAINFALL_SOURCE_NAME
+    }
+
 # --- Tool 1: Get Single Year Rainfall ---
 def get_live_rainfall_data(state: str, year: int) -> Dict[str, Any]:
     """
@@ -112,41 +548,91 @@ def get_live_rainfall_data(state: str, year: int) -> Dict[str, Any]:
     if not (1901 <= year <= 2017):
         return {"error": f"Invalid year {year}. Data is only available from 1901 to 2017.", "source": RAINFALL_SOURCE_NAME}
     
-    params = {"api-key": DATA_GOV_API_KEY, "format": "json", "limit": 5000}
     try:
-        r = requests.get(RAINFALL_API_URL, params=params, timeout=20)
+        if RAINFALL_BULK_CACHE:
+            return _summarize_rainfall(_get_rainfall_df(), state, year)
+        return _query_rainfall_year(state, year)
+    except Exception as e:
+        return {"error": f"Unexpected error in rainfall API: {e}", "source": RAINFALL_SOURCE_NAME}
+
+def _summarize_filtered(records: List[Dict[str, Any]], state: str, year: int) -> Optional[Dict[str, Any]]:
+    """Summary from a server-side filtered response, or None when the filter did not find the state/year."""
+    if not records:
+        return None
+    result = _summarize_rainfall(_rainfall_frame(records), state, year)
+    return None if "error" in result else result
+
+def _get_rainfall_fallback_df() -> pd.DataFrame:
+    """
+    Full rainfall table for per-year lookups the server-side filter misses,
+    fetched once per process and kept in memory only (no disk cache).
+    """
+    global _rainfall_fallback_df
+    if _rainfall_fallback_df is None:
+        with _RAINFALL_LOCK:
+            if _rainfall_fallback_df is None:
+                _rainfall_fallback_df, _ = _fetch_rainfall_df()
+    return _rainfall_fallback_df
+
+def _known_rainfall_year(state: str, year: int) -> Optional[Dict[str, Any]]:
+    """
+    A (state, year) result that needs no request: memoized (including "no data"
+    errors), or summarized from the fallback table once it has been fetched.
+    """
+    cached = _rainfall_year_cache.get((state.lower().strip(), year))
+    if cached is not None:
+        return cached if "error" in cached else {**cached, "state": state}
+    if _rainfall_fallback_df is not None:
+        return _remember_rainfall(state, year, _summarize_rainfall(_rainfall_fallback_df, state, year))
+    return None
+
+def _resolve_rainfall_year(records: List[Dict[str, Any]], state: str, year: int) -> Dict[str, Any]:
+    """Summarizes a filtered response, falling back to the full table on a miss, and memoizes the result."""
+    result = _summarize_filtered(records, state, year)
+    if result is None:
+        result = _summarize_rainfall(_get_rainfall_fallback_df(), state, year)
+    return _remember_rainfall(state, year, result)
+
+def _remember_rainfall(state: str, year: int, result: Dict[str, Any]) -> Dict[str, Any]:
+    _rainfall_year_cache[(state.lower().strip(), year)] = result
+    return result
+
+def _query_rainfall_year(state: str, year: int) -> Dict[str, Any]:
+    """
+    Per-(state, year) API lookup, memoized for the process lifetime.
+    Tries data.gov.in's exact-match filters first (a few records instead of 5000);
+    if they find nothing (e.g. 'Haryana' vs 'Haryana Delhi & Chandigarh'), falls back to the full table.
+    """
+    known = _known_rainfall_year(state, year)
+    if known is not None:
+        return known
+    return _resolve_rainfall_year(_fetch_rainfall_records(_rainfall_params(state, year)), state, year)
+
+async def _fetch_rainfall_year(client: httpx.AsyncClient, state: str, year: int) -> Dict[str, Any]:
+    """Async counterpart of _query_rainfall_year (same filters, fallback and memo)."""
+    known = _known_rainfall_year(state, year)
+    if known is not None:
+        return known
+
+    try:
+        r = await client.get(RAINFALL_API_URL, params=_rainfall_params(state, year))
         r.raise_for_status()
-        records = r.json().get("records", [])
-        if not records:
-            return {"error": "No rainfall records returned by API.", "source": RAINFALL_SOURCE_NAME}
-        
-        df = pd.DataFrame(records)
-        df["year"] = pd.to_numeric(df["year"], errors="coerce")
-        df_filtered = df[(df["subdivision"].str.contains(state, case=False, na=False)) & (df["year"] == year)].copy()
-        
-        if df_filtered.empty:
-            available = sorted(df[df["subdivision"].str.contains(state, case=False, na=False)]["year"].dropna().unique().tolist())
-            return {"error": f"No data for {state} in {year}. Available years for this state: {available}", "source": RAINFALL_SOURCE_NAME}
-        
-        months = ["jan","feb","mar","apr","may","jun","jul","aug","sep","oct","nov","dec"]
-        for m in months:
-            if m not in df_filtered.columns:
-                df_filtered[m] = 0
-        df_filtered[months] = df_filtered[months].apply(pd.to_numeric, errors="coerce").fillna(0)
-        
-        total = float(df_filtered[months].sum(axis=1).iloc[0])
-        avg = float(df_filtered[months].mean(axis=1).iloc[0])
-        
-        return {
-            "state": state,
-            "year": int(year),
-            "total_rainfall_mm": round(total, 2),
-            "average_monthly_rainfall_mm": round(avg, 2),
-            "source": RAINFALL_SOURCE_NAME
-        }
+        # A miss may block on the one-off full-table fetch, so resolve off the event loop
+        return await asyncio.to_thread(_resolve_rainfall_year, r.json().get("records", []), state, year)
     except Exception as e:
         return {"error": f"Unexpected error in rainfall API: {e}", "source": RAINFALL_SOURCE_NAME}
 
+async def _get_rainfall_trend_async(state: str, years: List[int]) -> List[Dict[str, Any]]:
+    """Fetches every year concurrently, bounded by RAINFALL_MAX_CONCURRENCY."""
+    sem = asyncio.Semaphore(RAINFALL_MAX_CONCURRENCY)
+
+    async def bounded(client: httpx.AsyncClient, year: int) -> Dict[str, Any]:
+        async with sem:
+            return await _fetch_rainfall_year(client, state, year)
+
+    async with httpx.AsyncClient(timeout=20) as client:
+        return await asyncio.gather(*[bounded(client, y) for y in years])
+
 # --- Tool 2: Get Agriculture Data ---
 def get_local_agriculture_data(
     state: str,
@@ -160,21 +646,18 @@ def get_local_agriculture_data(
     If 'crop' is NOT provided, returns the 'top_n' most produced crops.
     """
     try:
-        df = get_agri_data()
-        mask = (df["state"].str.contains(state, case=False, na=False)) & (df["year"] == int(year))
-        filtered = df[mask]
+        totals = crop_totals(state, int(year))
         
-        if filtered.empty:
+        if totals.empty:
             return {"error": f"No agriculture data found for {state} in {year}.", "source": AGRICULTURE_SOURCE_NAME}
 
         # Query 1: Get total for a *specific* crop
         if crop:
-            crop_mask = filtered["crop"].str.contains(crop, case=False, na=False)
-            crop_data = filtered[crop_mask]
-            if crop_data.empty:
+            crop_mask = totals.index.str.lower().str.contains(crop.lower(), regex=False)
+            if not crop_mask.any():
                 return {"error": f"No data found for crop '{crop}' in {state} in {year}.", "source": AGRICULTURE_SOURCE_NAME}
             
-            total_production = float(crop_data["production_tonnes"].sum())
+            total_production = float(totals[crop_mask].sum())
             return {
                 "state": state,
                 "year": year,
@@ -184,8 +667,8 @@ def get_local_agriculture_data(
             }
 
         # Query 2: Get Top N crops (if no specific crop is asked)
-        summary = filtered.groupby("crop", as_index=False)["production_tonnes"].sum().sort_values("production_tonnes", ascending=False).head(top_n)
-        rows = summary.to_dict(orient="records")
+        summary = totals.nlargest(top_n)
+        rows = [{"crop": c, "production_tonnes": float(v)} for c, v in summary.items()]
         return {"state": state, "year": year, "top_crops": rows, "source": AGRICULTURE_SOURCE_NAME}
         
     except Exception as e:
@@ -203,38 +686,28 @@ def get_district_production(
     'sort_order' can be 'desc' (for highest) or 'asc' (for lowest).
     """
     try:
-        df = get_agri_data()
-        if "district" not in df.columns:
+        if "district" not in get_agri_data().columns:
             return {"error": "District column not found in CSV.", "source": AGRICULTURE_SOURCE_NAME}
 
-        mask = (df["state"].str.contains(state, case=False, na=False)) & \
-               (df["year"] == int(year)) & \
-               (df["crop"].str.contains(crop, case=False, na=False))
-        
-        filtered = df[mask]
-        if filtered.empty:
+        agg = district_totals(state, int(year), crop)
+        if agg.empty:
             return {"error": f"No data found for {crop} in {state} in {year}.", "source": AGRICULTURE_SOURCE_NAME}
 
-        summary = filtered.groupby("district", as_index=False)["production_tonnes"].sum()
-        
+        # Only the extremum is needed, so skip sorting the whole summary
         if sort_order == 'asc':
-            summary = summary.sort_values("production_tonnes", ascending=True)
+            district = agg.idxmin()
             result_label = "lowest_production_district"
         else:
-            summary = summary.sort_values("production_tonnes", ascending=False)
+            district = agg.idxmax()
             result_label = "highest_production_district"
 
-        if summary.empty:
-            return {"error": f"No district data found for {crop} in {state} in {year}.", "source": AGRICULTURE_SOURCE_NAME}
-
-        top_district = summary.iloc[0].to_dict()
         return {
             "state": state,
             "year": year,
             "crop": crop,
             result_label: {
-                "district": top_district["district"],
-                "production_tonnes": round(top_district["production_tonnes"], 2)
+                "district": district,
+                "production_tonnes": round(float(agg.loc[district]), 2)
             },
             "source": AGRICULTURE_SOURCE_NAME
         }
@@ -250,20 +723,12 @@ def get_production_trend(
 ) -> Dict[str, Any]:
     """Returns a time-series list of total production for a crop over a range of years."""
     try:
-        df = get_agri_data()
-        trend = []
-        for year in range(int(start_year), int(end_year) + 1):
-            mask = (df["state"].str.contains(state, case=False, na=False)) & \
-                   (df["year"] == year) & \
-                   (df["crop"].str.contains(crop, case=False, na=False))
-            
-            year_data = df[mask]
-            total_production = 0.0
-            if not year_data.empty:
-                total_production = float(year_data["production_tonnes"].sum())
-            
-            trend.append({"year": year, "production_tonnes": round(total_production, 2)})
-            
+        start_year, end_year = int(start_year), int(end_year)
+        # One groupby over the whole range; years with no rows are filled with 0
+        agg = year_totals(state, crop, start_year, end_year)
+        agg = agg.reindex(range(start_year, end_year + 1), fill_value=0.0).round(2)
+        trend = [{"year": int(y), "production_tonnes": float(v)} for y, v in agg.items()]
+
         return {"state": state, "crop": crop, "trend": trend, "source": AGRICULTURE_SOURCE_NAME}
     except Exception as e:
         return {"error": f"Unexpected error in get_production_trend: {e}", "source": AGRICULTURE_SOURCE_NAME}
@@ -277,15 +742,22 @@ def get_rainfall_trend(
     """
     (DEPRECATED DATA: 1901-2017)
     Returns a time-series list of total rainfall over a range of years.
-    NOTE: This tool calls the old API multiple times and is limited to 2017.
+    NOTE: Served from the cached rainfall table (or concurrent API calls when
+    RAINFALL_BULK_CACHE=0); limited to 2017.
     """
     trend = []
     # Clamp years to the available data range
     query_start = max(1901, int(start_year))
     query_end = min(2017, int(end_year))
 
-    for year in range(query_start, query_end + 1):
-        result = get_live_rainfall_data(state, year)
+    years = list(range(query_start, query_end + 1))
+    if RAINFALL_BULK_CACHE:
+        results = [get_live_rainfall_data(state, year) for year in years]
+    else:
+        # No bulk cache: fan the per-year API calls out concurrently
+        results = asyncio.run(_get_rainfall_trend_async(state, years))
+
+    for year, result in zip(years, results):
         if "error" in result:
             trend.append({"year": year, "total_rainfall_mm": None, "note": result["error"]})
         else:
@@ -298,34 +770,67 @@ def get_rainfall_trend(
         "source": RAINFALL_SOURCE_NAME
     }
 
+# ---------------------------
+# Tool Argument Models
+# ---------------------------
+# Validated before dispatch so bad LLM arguments are reported back without calling the tool.
+# Unknown keys are ignored (pydantic's default).
+# Their JSON Schemas are also what the prompt shows the LLM, so the two cannot drift apart.
+class RainfallArgs(BaseModel):
+    state: str
+    year: int
+
+class AgricultureArgs(BaseModel):
+    state: str
+    year: int
+    crop: Optional[str] = None
+    top_n: int = 5
+
+class DistrictProductionArgs(BaseModel):
+    state: str
+    crop: str
+    year: int
+    sort_order: Literal["desc", "asc"] = "desc"
+
+class ProductionTrendArgs(BaseModel):
+    state: str
+    crop: str
+    start_year: int
+    end_year: int
+
+class RainfallTrendArgs(BaseModel):
+    state: str
+    start_year: int
+    end_year: int
+
 # ---------------------------
 # Tools Registry
 # ---------------------------
 TOOLS = {
     "get_live_rainfall_data": {
         "func": get_live_rainfall_data,
-        "desc": "Get total/avg rainfall for a *single state* and *single year*. (Data 1901-2017 ONLY)",
-        "schema": {"state": "string", "year": "integer"}
+        "args": RainfallArgs,
+        "desc": "Get total/avg rainfall for a *single state* and *single year*. (Data 1901-2017 ONLY)"
     },
     "get_local_agriculture_data": {
         "func": get_local_agriculture_data,
-        "desc": "Get agriculture data for a *single state* and *single year*. Provide 'crop' to get its total, or 'top_n' to get a list of top crops.",
-        "schema": {"state": "string", "year": "integer", "crop": "string (optional)", "top_n": "integer (optional, default 5)"}
+        "args": AgricultureArgs,
+        "desc": "Get agriculture data for a *single state* and *single year*. Provide 'crop' to get its total, or 'top_n' to get a list of top crops."
     },
     "get_district_production": {
         "func": get_district_production,
-        "desc": "Finds the district with the highest ('desc') or lowest ('asc') production for a *specific crop*, *state*, and *year*.",
-        "schema": {"state": "string", "crop": "string", "year": "integer", "sort_order": "string ('desc' or 'asc', default 'desc')"}
+        "args": DistrictProductionArgs,
+        "desc": "Finds the district with the highest ('desc') or lowest ('asc') production for a *specific crop*, *state*, and *year*."
     },
     "get_production_trend": {
         "func": get_production_trend,
-        "desc": "Get a time-series list of production for *one crop* in *one state* over a *range of years*.",
-        "schema": {"state": "string", "crop": "string", "start_year": "integer", "end_year": "integer"}
+        "args": ProductionTrendArgs,
+        "desc": "Get a time-series list of production for *one crop* in *one state* over a *range of years*."
     },
     "get_rainfall_trend": {
         "func": get_rainfall_trend,
-        "desc": "Get a time-series list of total rainfall for *one state* over a *range of years*. (Data 1901-2017 ONLY)",
-        "schema": {"state": "string", "start_year": "integer", "end_year": "integer"}
+        "args": RainfallTrendArgs,
+        "desc": "Get a time-series list of total rainfall for *one state* over a *range of years*. (Data 1901-2017 ONLY)"
     }
 }
 
@@ -342,34 +847,117 @@ You have access to the following tools:
 You must follow this process:
 1.  **Think:** Analyze the user's question and the conversation history.
 2.  **Reason:** Decide if you have enough information to answer.
-    - If YES, you *must* respond with your final answer, prefixed with "Final Answer:".
+    - If YES, you *must* respond with your final answer as a JSON object: {{"final_answer": "<your answer in Markdown>"}}.
     - If NO, you must choose *one* tool to call to get the missing information.
 3.  **Act:** If you need to call a tool, you must respond with *only* a single JSON object. This JSON must contain "tool" (the tool name) and "args" (a dictionary of arguments).
+    - If you need several *independent* results (e.g. the same data for two states), you may request them together as {{"parallel_tools": [{{"tool": "...", "args": {{...}}}}, ...]}}. They run concurrently and you receive all results at once.
+
+Every response is a single JSON object: a tool call, a "parallel_tools" request, or a final answer.
 
 **RULES:**
--   **Multi-step:** For complex questions (like "compare X and Y" or "correlate A and B"), you must call tools multiple times. Call for X, get the result, then call for Y, get the result, then provide the "Final Answer:".
+-   **Multi-step:** For complex questions (like "compare X and Y" or "correlate A and B"), you must call tools multiple times. Call for X and Y (together via "parallel_tools" when they are independent), get the results, then provide the "final_answer".
 -   **Traceability:** You *must* cite the "source" field returned by the tools for every piece of data you present.
 -   **Data Limitations:** The rainfall API only has data from 1901-2017. Politely inform the user if they ask for data outside this range.
--   **Errors:** If a tool returns an error, explain the error to the user and suggest how to fix their query. Do not try to call another tool.
+-   **Errors:** If a tool returns an error, explain the error to the user and suggest how to fix their query. Do not try to call another tool. The only exception is an "Invalid arguments" error: fix the arguments and call the same tool again.
 -   **Comparisons:** When comparing two or more items (like "compare X and Y"), you *must* present the final comparison in a Markdown table.
-**Conversation History:**
-{history}
+"""
 
-**User Question:**
+# Per-turn part of the prompt; everything static lives in the system message above
+AGENT_USER_PROMPT = """**User Question:**
 {user_query}
 
-Your response (either JSON for a tool call, or "Final Answer: ..." text):
+Your response (a single JSON object: either a tool call or a final answer):
 """
 
 MAX_STEPS = 8 # Max number of tool calls to prevent infinite loops
+MAX_PARALLEL_TOOLS = 4 # Worker threads for a "parallel_tools" step
+HISTORY_KEEP_FULL = 3 # Most recent tool outputs sent verbatim; older ones are truncated
+HISTORY_TRUNCATE_CHARS = 500
+HISTORY_TRUNCATE_ITEMS = 5 # List entries kept when truncating an older structured tool output
 
 def get_tool_definitions() -> str:
     """Helper to format tool descriptions for the prompt."""
     defs = []
     for name, info in TOOLS.items():
-        defs.append(f"- Tool: `{name}`\n  - Description: {info['desc']}\n  - Arguments (JSON Schema): {json.dumps(info['schema'])}")
+        defs.append(f"- Tool: `{name}`\n  - Description: {info['desc']}\n  - Arguments (JSON Schema): {json.dumps(info['args'].model_json_schema())}")
     return "\n".join(defs)
 
+# Built once so every LLM turn sends a byte-identical prefix (eligible for prompt caching)
+SYSTEM_PREFIX = AGENT_SYSTEM_PROMPT.format(tool_definitions=get_tool_definitions())
+
+def compact_tool_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Drops per-year notes from trend results so only (year, value) pairs reach the LLM."""
+    if not isinstance(result.get("trend"), list):
+        return result
+    compact = dict(result)
+    compact["trend"] = [{k: v for k, v in point.items() if k != "note"} for point in result["trend"]]
+    return compact
+
+def truncate_tool_result(value: Any) -> Any:
+    """
+    Shortens a tool result for older history entries: lists keep their first
+    HISTORY_TRUNCATE_ITEMS entries and long strings are cut, but every "source"
+    field is kept verbatim so the final answer can still cite it.
+    """
+    if isinstance(value, dict):
+        return {k: v if k == "source" else truncate_tool_result(v) for k, v in value.items()}
+    if isinstance(value, list):
+        kept = [truncate_tool_result(v) for v in value[:HISTORY_TRUNCATE_ITEMS]]
+        if len(value) > HISTORY_TRUNCATE_ITEMS:
+            kept.append(f"...({len(value) - HISTORY_TRUNCATE_ITEMS} more truncated)")
+        return kept
+    if isinstance(value, str) and len(value) > HISTORY_TRUNCATE_CHARS:
+        return value[:HISTORY_TRUNCATE_CHARS] + "...(truncated)"
+    return value
+
+def compact_history(history: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """
+    Returns the role-based messages to send, truncating all but the last
+    HISTORY_KEEP_FULL tool outputs so prompt size grows linearly with steps.
+    """
+    tool_steps = [i for i, item in enumerate(history) if item.get("kind") == "tool_output"]
+    older = set(tool_steps[:-HISTORY_KEEP_FULL])
+    messages = []
+    for i, item in enumerate(history):
+        content = item["content"]
+        if i in older and len(content) > HISTORY_TRUNCATE_CHARS:
+            if "result" in item:
+                # Truncate the parsed payload rather than the string, so "source" survives
+                content = f"Tool output: {json.dumps(truncate_tool_result(item['result']), ensure_ascii=False)}"
+            else:
+                content = content[:HISTORY_TRUNCATE_CHARS] + "...(truncated)"
+        messages.append({"role": item["role"], "content": content})
+    return messages
+
+
+def execute_tool_call(call: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validates the arguments of one {"tool", "args"} call and runs the tool.
+    Invalid arguments are returned as an error result instead of calling the tool.
+    """
+    tool_name = call.get("tool")
+    args = call.get("args", {})
+
+    if tool_name not in TOOLS:
+        raise ValueError(f"LLM chose unknown tool: {tool_name}")
+
+    try:
+        validated = TOOLS[tool_name]["args"].model_validate(args)
+    except ValidationError as e:
+        details = e.errors(include_url=False, include_context=False)
+        return {"error": f"Invalid arguments for {tool_name}. Fix them and call the tool again.", "details": details}
+
+    print(f"Calling Tool: {tool_name}({args})")
+    func = TOOLS[tool_name]["func"]
+    return func(**validated.model_dump())
+
+def _execute_parallel_call(call: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs one entry of a parallel_tools step; a failure only affects that entry."""
+    try:
+        return execute_tool_call(call)
+    except Exception as e:
+        return {"error": f"Tool call failed: {e}"}
+
 
 def run_agent(user_query: str) -> Dict[str, Any]:
     """
@@ -377,67 +965,72 @@ def run_agent(user_query: str) -> Dict[str, Any]:
     Runs a multi-step loop to reason, call tools, and get a final answer.
     """
     print(f"\n--- New Query: {user_query} ---")
-    history: List[Dict[str, str]] = []
-    tool_defs = get_tool_definitions()
+    # Role-based history; the static system prefix is sent separately by llm_call
+    history: List[Dict[str, Any]] = [{"role": "user", "content": AGENT_USER_PROMPT.format(user_query=user_query)}]
     
     for i in range(MAX_STEPS):
         print(f"--- Step {i+1} ---")
         
-        # 1. Format the prompt
-        history_str = "\n".join([f"Role: {item['role']}\nContent: {item['content']}" for item in history])
-        prompt = AGENT_SYSTEM_PROMPT.format(
-            tool_definitions=tool_defs,
-            history=history_str or "No history yet.",
-            user_query=user_query # Only include query on first turn
-        )
+        # 1. Build the messages, truncating older tool outputs
+        messages = compact_history(history)
         
         # 2. Ask LLM for the next step (Reasoning)
         try:
-            raw_response = llm_call(prompt)
+            raw_response = llm_call(SYSTEM_PREFIX, messages, json_mode=True)
             print(f"LLM Response:\n{raw_response}")
         except Exception as e:
             print(f"LLM Call Error: {e}")
             return {"error": f"Error communicating with LLM: {e}"}
 
         # 3. Decide: Is it a Final Answer or a Tool Call?
-        
+        # JSON mode makes both shapes JSON; plain "Final Answer:" text is still accepted
         if raw_response.strip().startswith("Final Answer:"):
-            # --- It's a final answer. We're done. ---
             final_answer = raw_response.strip().replace("Final Answer:", "").strip()
-            print(f"Final Answer Generated.\n")
+            print("Final Answer Generated.\n")
             return {"final_answer": final_answer}
-        
-        else:
-            # --- It's a tool call. ---
-            try:
-                # Add the LLM's "thought" (the tool call JSON) to history
-                history.append({"role": "assistant (tool call)", "content": raw_response})
-
-                choice = safe_json_parse(raw_response)
-                tool_name = choice.get("tool")
-                args = choice.get("args", {})
-
-                if tool_name not in TOOLS:
-                    raise ValueError(f"LLM chose unknown tool: {tool_name}")
-
-                # 4. Execute the tool
-                print(f"Calling Tool: {tool_name}({args})")
-                func = TOOLS[tool_name]["func"]
-                result = func(**args)
-                
-                # 5. Add tool output to history
-                tool_output_str = json.dumps(result, ensure_ascii=False)
-                print(f"Tool Output:\n{tool_output_str}")
-                history.append({"role": "tool_output", "content": tool_output_str})
-                
-                # Loop continues, LLM will see the tool output in the next step
+
+        try:
+            # Add the LLM's "thought" (the JSON response) to history
+            history.append({"role": "assistant", "content": raw_response})
+
+            choice = safe_json_parse(raw_response)
+            if "final_answer" in choice:
+                # --- It's a final answer. We're done. ---
+                print("Final Answer Generated.\n")
+                return {"final_answer": str(choice["final_answer"]).strip()}
+
+            # 4. Execute the tool call(s)
+            if "parallel_tools" in choice:
+                # --- Independent tool calls, run concurrently. ---
+                calls = choice["parallel_tools"]
+                if not isinstance(calls, list) or not calls or not all(isinstance(c, dict) for c in calls):
+                    raise ValueError("'parallel_tools' must be a non-empty list of {'tool', 'args'} objects")
+                with ThreadPoolExecutor(max_workers=MAX_PARALLEL_TOOLS) as executor:
+                    outputs = list(executor.map(_execute_parallel_call, calls))
+                result = {
+                    "parallel_results": [
+                        {"tool": call.get("tool"), "args": call.get("args", {}), "result": compact_tool_result(output)}
+                        for call, output in zip(calls, outputs)
+                    ]
+                }
+            else:
+                # --- It's a tool call. ---
+                result = execute_tool_call(choice)
+            
+            # 5. Add tool output to history
+            result = compact_tool_result(result)
+            tool_output_str = json.dumps(result, ensure_ascii=False)
+            print(f"Tool Output:\n{tool_output_str}")
+            history.append({"role": "user", "kind": "tool_output", "content": f"Tool output: {tool_output_str}", "result": result})
             
-            except Exception as e:
-                print(f"Tool/JSON Error: {e}")
-                # Add the error to history so the LLM can see what went wrong
-                error_str = f"Error: {e}. The LLM response was not valid JSON or the tool call failed. Make sure to respond with *only* JSON for tool calls or 'Final Answer:' for answers."
-                history.append({"role": "tool_output", "content": error_str})
-                # Continue loop, let LLM try to recover or report error
+            # Loop continues, LLM will see the tool output in the next step
+        
+        except Exception as e:
+            print(f"Tool/JSON Error: {e}")
+            # Add the error to history so the LLM can see what went wrong
+            error_str = f"Error: {e}. The LLM response was not valid JSON or the tool call failed. Make sure to respond with *only* a JSON object: a tool call or a final answer."
+            history.append({"role": "user", "kind": "tool_output", "content": f"Tool output: {error_str}"})
+            # Continue loop, let LLM try to recover or report error
 
     # If we exit the loop, we've hit MAX_STEPS
     print("--- Max steps reached ---")
@@ -450,6 +1043,7 @@ def run_agent(user_query: str) -> Dict[str, Any]:
 
 def safe_json_parse(text: str) -> Dict:
     """Try to safely extract valid JSON from LLM output."""
+    json_text = text
     try:
         # Find first { and last }
         start = text.find("{")
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import FastAPI
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
@@ -31,13 +32,14 @@ def read_root():
     return {"status": "Project Samarth API is running"}
 
 @app.post("/query")
-def handle_query(query: Query):
+async def handle_query(query: Query):
     """
     Receives a user query, passes it to the full agent (which decides tools + returns results).
+    The agent runs in a worker thread so the event loop stays free while it waits on the LLM.
     """
     try:
         # The new run_agent function will handle the multi-step logic
-        result = run_agent(query.query)
+        result = await asyncio.to_thread(run_agent, query.query)
 
         # This logic correctly handles the output from the new multi-step agent
         if isinstance(result, dict) and "final_answer" in result: